@@ -6,15 +6,16 @@ Helper utility to manage search URLs for the Cian parser.
 Usage:
     python manage_search_urls.py list
     python manage_search_urls.py add --url URL --name NAME
-    python manage_search_urls.py enable --id ID
-    python manage_search_urls.py disable --id ID
+    python manage_search_urls.py enable --id ID [ID ...]
+    python manage_search_urls.py disable --id ID [ID ...]
     python manage_search_urls.py delete --id ID
 """
 
 import argparse
+import functools
 import sys
 import os
-from datetime import datetime
+from sqlalchemy import func, insert
 
 # Add project root to sys.path
 current_dir = os.path.dirname(os.path.abspath(__file__))
@@ -22,174 +23,153 @@ project_root = os.path.dirname(current_dir)
 if project_root not in sys.path:
     sys.path.insert(0, project_root)
 
-from src.core.database import SessionLocal, SearchUrl
-
-
-def list_search_urls(active_only=False):
+from src.core.database import SessionLocal, SearchUrl, Offer
+
+
+def with_session(action):
+    """Run a command with its own session: rollback and report on error, always close"""
+    def decorator(command):
+        @functools.wraps(command)
+        def wrapper(*args, **kwargs):
+            db = SessionLocal()
+            try:
+                return command(db, *args, **kwargs)
+            except Exception as e:
+                print(f"❌ Error {action} search URL: {e}")
+                db.rollback()
+                return False
+            finally:
+                db.close()
+        return wrapper
+    return decorator
+
+
+@with_session("listing")
+def list_search_urls(db, active_only=False):
     """List all search URLs"""
-    db = SessionLocal()
-    try:
-        query = db.query(SearchUrl)
-        if active_only:
-            query = query.filter(SearchUrl.is_active == True)
-        
-        search_urls = query.order_by(SearchUrl.id).all()
-        
-        if not search_urls:
-            print("No search URLs found.")
-            return
-        
-        print("=" * 80)
-        print("SEARCH URLs")
-        print("=" * 80)
-        
-        for su in search_urls:
-            status = "✅ ACTIVE" if su.is_active else "❌ INACTIVE"
-            last_parsed = su.last_parsed_at.strftime("%Y-%m-%d %H:%M") if su.last_parsed_at else "Never"
-            
-            print(f"\nID: {su.id}")
-            print(f"Name: {su.name}")
-            print(f"Status: {status}")
-            print(f"Last parsed: {last_parsed}")
-            print(f"URL: {su.url}")
-            print("-" * 80)
-        
-        print(f"\nTotal: {len(search_urls)} search URL(s)")
-        if not active_only:
-            active_count = sum(1 for su in search_urls if su.is_active)
-            print(f"Active: {active_count}")
-    finally:
-        db.close()
+    query = db.query(SearchUrl)
+    if active_only:
+        query = query.filter(SearchUrl.is_active == True)
+    
+    search_urls = query.order_by(SearchUrl.id).all()
+    
+    if not search_urls:
+        print("No search URLs found.")
+        return
+    
+    print("=" * 80)
+    print("SEARCH URLs")
+    print("=" * 80)
+    
+    for su in search_urls:
+        status = "✅ ACTIVE" if su.is_active else "❌ INACTIVE"
+        last_parsed = su.last_parsed_at.strftime("%Y-%m-%d %H:%M") if su.last_parsed_at else "Never"
+        
+        print(f"\nID: {su.id}")
+        print(f"Name: {su.name}")
+        print(f"Status: {status}")
+        print(f"Last parsed: {last_parsed}")
+        print(f"URL: {su.url}")
+        print("-" * 80)
+    
+    print(f"\nTotal: {len(search_urls)} search URL(s)")
+    if not active_only:
+        active_count = sum(1 for su in search_urls if su.is_active)
+        print(f"Active: {active_count}")
 
 
-def add_search_url(url, name):
+@with_session("adding")
+def add_search_url(db, url, name):
     """Add new search URL"""
-    db = SessionLocal()
-    try:
-        # Check if URL already exists
-        existing = db.query(SearchUrl).filter(SearchUrl.url == url).first()
-        if existing:
-            print(f"❌ Error: Search URL already exists with ID {existing.id}")
-            print(f"   Name: {existing.name}")
-            return False
-        
-        # Create new search URL
-        search_url = SearchUrl(
-            url=url,
-            name=name,
-            is_active=True
-        )
-        db.add(search_url)
-        db.commit()
-        db.refresh(search_url)
-        
-        print(f"✅ Successfully added search URL")
-        print(f"   ID: {search_url.id}")
-        print(f"   Name: {search_url.name}")
-        print(f"   URL: {search_url.url}")
-        return True
-    except Exception as e:
-        print(f"❌ Error adding search URL: {e}")
-        db.rollback()
-        return False
-    finally:
-        db.close()
-
-
-def enable_search_url(search_url_id):
-    """Enable (activate) search URL"""
-    db = SessionLocal()
-    try:
-        search_url = db.query(SearchUrl).filter(SearchUrl.id == search_url_id).first()
-        if not search_url:
-            print(f"❌ Error: Search URL with ID {search_url_id} not found")
-            return False
-        
-        if search_url.is_active:
-            print(f"ℹ️  Search URL '{search_url.name}' is already active")
-            return True
-        
-        search_url.is_active = True
-        db.commit()
-        
-        print(f"✅ Successfully enabled search URL")
-        print(f"   ID: {search_url.id}")
-        print(f"   Name: {search_url.name}")
-        return True
-    except Exception as e:
-        print(f"❌ Error enabling search URL: {e}")
-        db.rollback()
+    # Check if URL already exists
+    existing = db.query(SearchUrl).filter(SearchUrl.url == url).first()
+    if existing:
+        print(f"❌ Error: Search URL already exists with ID {existing.id}")
+        print(f"   Name: {existing.name}")
         return False
-    finally:
-        db.close()
+    
+    # Create new search URL
+    search_url = db.execute(
+        insert(SearchUrl)
+        .values(url=url, name=name, is_active=True)
+        .returning(SearchUrl.id, SearchUrl.name, SearchUrl.url)
+    ).one()
+    db.commit()
+    
+    print(f"✅ Successfully added search URL")
+    print(f"   ID: {search_url.id}")
+    print(f"   Name: {search_url.name}")
+    print(f"   URL: {search_url.url}")
+    return True
 
 
-def disable_search_url(search_url_id):
-    """Disable (deactivate) search URL"""
-    db = SessionLocal()
-    try:
-        search_url = db.query(SearchUrl).filter(SearchUrl.id == search_url_id).first()
-        if not search_url:
-            print(f"❌ Error: Search URL with ID {search_url_id} not found")
-            return False
-        
-        if not search_url.is_active:
-            print(f"ℹ️  Search URL '{search_url.name}' is already inactive")
-            return True
-        
-        search_url.is_active = False
+@with_session("updating")
+def set_search_url_active(db, search_url_ids, active):
+    """Enable or disable search URLs, changing all of them in one UPDATE"""
+    verb, state = ("enabled", "active") if active else ("disabled", "inactive")
+    
+    found = db.query(SearchUrl.id, SearchUrl.name, SearchUrl.is_active).filter(
+        SearchUrl.id.in_(search_url_ids)
+    ).order_by(SearchUrl.id).all()
+    
+    missing = sorted(set(search_url_ids) - {row.id for row in found})
+    for search_url_id in missing:
+        print(f"❌ Error: Search URL with ID {search_url_id} not found")
+    
+    to_change = []
+    for row in found:
+        if row.is_active == active:
+            print(f"ℹ️  Search URL '{row.name}' is already {state}")
+        else:
+            to_change.append(row)
+    
+    if to_change:
+        db.query(SearchUrl).filter(SearchUrl.id.in_([row.id for row in to_change])).update(
+            {SearchUrl.is_active: active}, synchronize_session=False
+        )
         db.commit()
         
-        print(f"✅ Successfully disabled search URL")
-        print(f"   ID: {search_url.id}")
-        print(f"   Name: {search_url.name}")
-        return True
-    except Exception as e:
-        print(f"❌ Error disabling search URL: {e}")
-        db.rollback()
-        return False
-    finally:
-        db.close()
+        for row in to_change:
+            print(f"✅ Successfully {verb} search URL")
+            print(f"   ID: {row.id}")
+            print(f"   Name: {row.name}")
+    
+    return not missing
 
 
-def delete_search_url(search_url_id):
+@with_session("deleting")
+def delete_search_url(db, search_url_id):
     """Delete search URL (with confirmation)"""
-    db = SessionLocal()
-    try:
-        search_url = db.query(SearchUrl).filter(SearchUrl.id == search_url_id).first()
-        if not search_url:
-            print(f"❌ Error: Search URL with ID {search_url_id} not found")
-            return False
-        
-        # Show info
-        print(f"⚠️  About to delete search URL:")
-        print(f"   ID: {search_url.id}")
-        print(f"   Name: {search_url.name}")
-        print(f"   URL: {search_url.url}")
-        
-        # Count linked offers
-        offer_count = len(search_url.offers)
-        if offer_count > 0:
-            print(f"\n⚠️  WARNING: This search URL has {offer_count} linked offer(s)")
-            print(f"   Deletion will remove the link, but offers will remain in database")
-        
-        # Confirm
-        response = input("\nAre you sure? (yes/no): ")
-        if response.lower() != 'yes':
-            print("❌ Deletion cancelled")
-            return False
-        
-        db.delete(search_url)
-        db.commit()
-        
-        print(f"✅ Successfully deleted search URL ID {search_url_id}")
-        return True
-    except Exception as e:
-        print(f"❌ Error deleting search URL: {e}")
-        db.rollback()
+    search_url = db.query(SearchUrl).filter(SearchUrl.id == search_url_id).first()
+    if not search_url:
+        print(f"❌ Error: Search URL with ID {search_url_id} not found")
         return False
-    finally:
-        db.close()
+    
+    # Show info
+    print(f"⚠️  About to delete search URL:")
+    print(f"   ID: {search_url.id}")
+    print(f"   Name: {search_url.name}")
+    print(f"   URL: {search_url.url}")
+    
+    # Count linked offers
+    offer_count = db.query(func.count(Offer.id)).filter(
+        Offer.search_url_id == search_url_id
+    ).scalar()
+    if offer_count > 0:
+        print(f"\n⚠️  WARNING: This search URL has {offer_count} linked offer(s)")
+        print(f"   Deletion will remove the link, but offers will remain in database")
+    
+    # Confirm
+    response = input("\nAre you sure? (yes/no): ")
+    if response.lower() != 'yes':
+        print("❌ Deletion cancelled")
+        return False
+    
+    db.delete(search_url)
+    db.commit()
+    
+    print(f"✅ Successfully deleted search URL ID {search_url_id}")
+    return True
 
 
 def main():
@@ -212,8 +192,8 @@ Examples:
   # Enable search URL
   python manage_search_urls.py enable --id 1
   
-  # Disable search URL
-  python manage_search_urls.py disable --id 1
+  # Disable several search URLs at once
+  python manage_search_urls.py disable --id 1 2 3
   
   # Delete search URL (with confirmation)
   python manage_search_urls.py delete --id 1
@@ -233,11 +213,11 @@ Examples:
     
     # Enable command
     enable_parser = subparsers.add_parser('enable', help='Enable (activate) search URL')
-    enable_parser.add_argument('--id', type=int, required=True, help='Search URL ID')
+    enable_parser.add_argument('--id', type=int, nargs='+', required=True, help='Search URL ID(s)')
     
     # Disable command
     disable_parser = subparsers.add_parser('disable', help='Disable (deactivate) search URL')
-    disable_parser.add_argument('--id', type=int, required=True, help='Search URL ID')
+    disable_parser.add_argument('--id', type=int, nargs='+', required=True, help='Search URL ID(s)')
     
     # Delete command
     delete_parser = subparsers.add_parser('delete', help='Delete search URL')
@@ -256,10 +236,10 @@ Examples:
         if not add_search_url(args.url, args.name):
             sys.exit(1)
     elif args.command == 'enable':
-        if not enable_search_url(args.id):
+        if not set_search_url_active(args.id, True):
             sys.exit(1)
     elif args.command == 'disable':
-        if not disable_search_url(args.id):
+        if not set_search_url_active(args.id, False):
             sys.exit(1)
     elif args.command == 'delete':
         if not delete_search_url(args.id):
@@ -2,14 +2,15 @@ import asyncio
 import logging
 import os
 import sys
-from datetime import datetime
+import time
+from collections import OrderedDict
 
-from aiogram import Bot, Dispatcher, types, F
+from aiogram import Bot, Dispatcher, F
 from aiogram.filters import Command
 from aiogram.types import Message, CallbackQuery
 from aiogram.exceptions import TelegramBadRequest
-from dotenv import load_dotenv
-from sqlalchemy import text, desc, func
+from sqlalchemy import text, desc, func, not_, delete, exists, lambda_stmt, literal_column, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 
 # Add the project root to sys.path
 current_dir = os.path.dirname(os.path.abspath(__file__))
@@ -17,13 +18,11 @@ project_root = os.path.dirname(os.path.dirname(current_dir))
 if project_root not in sys.path:
     sys.path.insert(0, project_root)
 
-from src.core.database import SessionLocal, User, Offer, OfferDetail, OfferScore, OfferPrice
+from src.core.database import SessionLocal, User, Offer, OfferDetail, OfferScore, OfferPrice, UserInteraction, OfferStat, BannedMetro
 from src.bot.keyboards import get_main_keyboard, get_offer_inline_keyboard
+from src.core.config import Config
 
-# Load environment variables
-load_dotenv(os.path.join(project_root, ".env"))
-
-TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
+TOKEN = Config.TELEGRAM_BOT_TOKEN
 if not TOKEN or TOKEN == "your_bot_token_here":
     print("❌ Error: TELEGRAM_BOT_TOKEN not found in .env or is a placeholder.")
     sys.exit(1)
@@ -39,33 +38,94 @@ logger = logging.getLogger(__name__)
 bot = Bot(token=TOKEN)
 dp = Dispatcher()
 
+# Developer flag cache: telegram_id -> (expires_at, is_developer), least
+# recently used first; holds at most DEVELOPER_CACHE_SIZE users
+DEVELOPER_CACHE_TTL = 60
+DEVELOPER_CACHE_SIZE = 256
+_developer_cache = OrderedDict()
+
 # --- Helper Functions ---
 
+def get_user_id(db, telegram_id: int):
+    """Resolve the internal user id for a Telegram id (statement is compiled once and cached)"""
+    stmt = lambda_stmt(lambda: select(User.id).where(User.telegram_id == telegram_id))
+    return db.execute(stmt).scalar()
+
+def interaction_exists(db, user_id: int, kind: str):
+    """Correlated EXISTS clause for a user's like/dislike on Offer"""
+    return db.query(UserInteraction.id).filter(
+        UserInteraction.user_id == user_id,
+        UserInteraction.offer_id == Offer.id,
+        UserInteraction.interaction_type == kind
+    ).exists()
+
+def is_favorite_offer(db, user_id: int, offer_id: int) -> bool:
+    """Check whether the user liked the offer (statement is compiled once and cached)"""
+    stmt = lambda_stmt(lambda: select(exists().where(
+        UserInteraction.user_id == user_id,
+        UserInteraction.offer_id == offer_id,
+        UserInteraction.interaction_type == 'like'
+    )))
+    return db.execute(stmt).scalar()
+
+def check_developer(telegram_id: int) -> bool:
+    """Check developer access, cached for DEVELOPER_CACHE_TTL seconds"""
+    now = time.monotonic()
+    cached = _developer_cache.pop(telegram_id, None)
+    if cached and cached[0] > now:
+        _developer_cache[telegram_id] = cached
+        return cached[1]
+    
+    db = SessionLocal()
+    try:
+        is_developer = bool(
+            db.query(User.is_developer).filter(User.telegram_id == telegram_id).scalar()
+        )
+    finally:
+        db.close()
+    
+    _developer_cache[telegram_id] = (now + DEVELOPER_CACHE_TTL, is_developer)
+    if len(_developer_cache) > DEVELOPER_CACHE_SIZE:
+        _developer_cache.popitem(last=False)
+    return is_developer
+
+def invalidate_developer_cache(telegram_id: int = None):
+    """Drop the cached developer flag for one user, or for everyone"""
+    if telegram_id is None:
+        _developer_cache.clear()
+    else:
+        _developer_cache.pop(telegram_id, None)
+
 async def register_user(message: Message):
     """Register or update user in the database"""
     tg_user = message.from_user
     db = SessionLocal()
     try:
-        user = db.query(User).filter(User.telegram_id == tg_user.id).first()
-        is_developer = False
+        stmt = pg_insert(User).values(
+            telegram_id=tg_user.id,
+            username=tg_user.username,
+            first_name=tg_user.first_name,
+            last_name=tg_user.last_name,
+            is_active=True
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[User.telegram_id],
+            set_={
+                'username': stmt.excluded.username,
+                'first_name': stmt.excluded.first_name,
+                'last_name': stmt.excluded.last_name,
+                'last_activity_at': func.now()
+            }
+        ).returning(User.is_developer, literal_column('xmax = 0').label('inserted'))
+        user = db.execute(stmt).one()
+        is_developer = bool(user.is_developer)
+        # /start shows the flag just read, so later checks must not use an older one
+        invalidate_developer_cache(tg_user.id)
         
-        if not user:
-            user = User(
-                telegram_id=tg_user.id,
-                username=tg_user.username,
-                first_name=tg_user.first_name,
-                last_name=tg_user.last_name,
-                is_active=True
-            )
-            db.add(user)
+        if user.inserted:
             logger.info(f"🆕 New user registered: {tg_user.id} (@{tg_user.username})")
             welcome_msg = f"Привет, {tg_user.first_name}! Ты успешно зарегистрирован."
         else:
-            user.last_activity_at = datetime.now()
-            user.username = tg_user.username
-            user.first_name = tg_user.first_name
-            user.last_name = tg_user.last_name
-            is_developer = user.is_developer
             logger.info(f"👤 User active: {tg_user.id} (@{tg_user.username})")
             welcome_msg = f"С возвращением, {tg_user.first_name}!"
             
@@ -78,27 +138,22 @@ async def register_user(message: Message):
     finally:
         db.close()
 
-from sqlalchemy import and_, not_, exists
-from src.core.database import SessionLocal, User, Offer, OfferDetail, OfferScore, OfferPrice, UserInteraction, OfferStat, BannedMetro
+async def get_offer_data(index: int, user_tg_id: int, only_favorites: bool = False, sort_by: str = "score", db=None):
+    """Fetch offer data filtered by user interactions and sorted by preferred metric
 
-async def get_offer_data(index: int, user_tg_id: int, only_favorites: bool = False, sort_by: str = "score"):
-    """Fetch offer data filtered by user interactions and sorted by preferred metric"""
-    db = SessionLocal()
+    Pass an open session as db to reuse it; otherwise one is opened and closed here.
+    """
+    owns_session = db is None
+    if owns_session:
+        db = SessionLocal()
     try:
-        user = db.query(User).filter(User.telegram_id == user_tg_id).first()
-        if not user:
+        user_id = get_user_id(db, user_tg_id)
+        if user_id is None:
             return None, 0
             
         # Base filters
-        disliked_ids = db.query(UserInteraction.offer_id).filter(
-            UserInteraction.user_id == user.id,
-            UserInteraction.interaction_type == 'dislike'
-        ).subquery()
-        
-        liked_ids = db.query(UserInteraction.offer_id).filter(
-            UserInteraction.user_id == user.id,
-            UserInteraction.interaction_type == 'like'
-        ).subquery()
+        disliked = interaction_exists(db, user_id, 'dislike')
+        liked = interaction_exists(db, user_id, 'like')
 
         # Banned metros subquery
         banned_metros = db.query(BannedMetro.name).subquery()
@@ -108,11 +163,11 @@ async def get_offer_data(index: int, user_tg_id: int, only_favorites: bool = Fal
             db.query(Offer.id)
             .join(OfferScore, Offer.id == OfferScore.offer_id)
             .join(OfferDetail, Offer.id == OfferDetail.offer_id)
-            .filter(not_(Offer.id.in_(disliked_ids)))
+            .filter(not_(disliked))
             .filter(not_(OfferDetail.metro_name.in_(banned_metros)))
         )
         if only_favorites:
-            base_offers_query = base_offers_query.filter(Offer.id.in_(liked_ids))
+            base_offers_query = base_offers_query.filter(liked)
             
         count = base_offers_query.count()
         if count == 0:
@@ -159,9 +214,6 @@ async def get_offer_data(index: int, user_tg_id: int, only_favorites: bool = Fal
             )
             .filter(Offer.id.in_(base_offers_query.subquery()))
         )
-        
-        if only_favorites:
-            query = query.filter(Offer.id.in_(liked_ids))
 
         # Sorting
         if sort_by == "views":
@@ -181,11 +233,7 @@ async def get_offer_data(index: int, user_tg_id: int, only_favorites: bool = Fal
         offer, detail, score, price, stat = result
         
         # Check if is favorite
-        is_favorite = db.query(UserInteraction).filter(
-            UserInteraction.user_id == user.id,
-            UserInteraction.offer_id == offer.id,
-            UserInteraction.interaction_type == 'like'
-        ).first() is not None
+        is_favorite = is_favorite_offer(db, user_id, offer.id)
         
         address = "Адрес не указан"
         if detail.extra_attributes and isinstance(detail.extra_attributes, dict):
@@ -225,7 +273,8 @@ async def get_offer_data(index: int, user_tg_id: int, only_favorites: bool = Fal
             "mode": "favorites" if only_favorites else "all"
         }, count
     finally:
-        db.close()
+        if owns_session:
+            db.close()
 
 # --- Handlers ---
 
@@ -337,30 +386,35 @@ async def process_interaction(callback: CallbackQuery):
     
     db = SessionLocal()
     try:
-        user = db.query(User).filter(User.telegram_id == callback.from_user.id).first()
-        if not user:
+        user_id = get_user_id(db, callback.from_user.id)
+        if user_id is None:
             return
             
-        existing = db.query(UserInteraction).filter(
-            UserInteraction.user_id == user.id,
-            UserInteraction.offer_id == offer_id
-        ).first()
+        removed = None
+        if action == 'like':
+            # Toggle off favorite if it is already liked
+            removed = db.execute(
+                delete(UserInteraction)
+                .where(
+                    UserInteraction.user_id == user_id,
+                    UserInteraction.offer_id == offer_id,
+                    UserInteraction.interaction_type == 'like'
+                )
+                .returning(UserInteraction.id)
+            ).first()
         
-        if existing:
-            if action == 'like' and existing.interaction_type == 'like':
-                # Toggle off favorite
-                db.delete(existing)
-                msg = "💔 Удалено из избранного"
-            else:
-                existing.interaction_type = action
-                msg = "❤️ Добавлено в избранное" if action == 'like' else "👎 Пропущено (скрыто)"
+        if removed:
+            msg = "💔 Удалено из избранного"
         else:
-            interaction = UserInteraction(
-                user_id=user.id,
+            stmt = pg_insert(UserInteraction).values(
+                user_id=user_id,
                 offer_id=offer_id,
                 interaction_type=action
             )
-            db.add(interaction)
+            db.execute(stmt.on_conflict_do_update(
+                index_elements=[UserInteraction.user_id, UserInteraction.offer_id],
+                set_={'interaction_type': stmt.excluded.interaction_type}
+            ))
             msg = "❤️ Добавлено в избранное" if action == 'like' else "👎 Пропущено (скрыто)"
             
         db.commit()
@@ -370,14 +424,14 @@ async def process_interaction(callback: CallbackQuery):
         
         if action == 'dislike':
             # Auto-move to next if disliked
-            data, count = await get_offer_data(current_index, callback.from_user.id, only_favorites=only_favorites, sort_by=sort_by)
+            data, count = await get_offer_data(current_index, callback.from_user.id, only_favorites=only_favorites, sort_by=sort_by, db=db)
             if not data:
                 await callback.message.delete()
                 await callback.message.answer("🎉 Ого! Ты просмотрел всё, что было!")
                 return
         else:
             # Refresh current for Like toggle
-            data, count = await get_offer_data(current_index, callback.from_user.id, only_favorites=only_favorites, sort_by=sort_by)
+            data, count = await get_offer_data(current_index, callback.from_user.id, only_favorites=only_favorites, sort_by=sort_by, db=db)
             
         await callback.message.edit_text(
             data["text"],
@@ -397,12 +451,11 @@ async def process_interaction(callback: CallbackQuery):
 @dp.message(F.text == "📊 Статистика")
 async def handle_stats(message: Message):
     """Handle Stats button (Developer only)"""
+    if not check_developer(message.from_user.id):
+        return
+
     db = SessionLocal()
     try:
-        user = db.query(User).filter(User.telegram_id == message.from_user.id).first()
-        if not (user and user.is_developer):
-            return
-
         stats_query = text("""
             SELECT 
                 COUNT(*) as total_offers,
@@ -438,11 +491,7 @@ async def handle_stats(message: Message):
 @dp.message(F.text == "🔗 Управление URL")
 async def handle_manage_urls(message: Message):
     """Handle Manage URLs button (Developer only)"""
-    db = SessionLocal()
-    user = db.query(User).filter(User.telegram_id == message.from_user.id).first()
-    db.close()
-    
-    if not (user and user.is_developer):
+    if not check_developer(message.from_user.id):
         return
         
     await message.answer("⚙️ Меню управления источниками Cian. (В разработке)")
@@ -450,11 +499,7 @@ async def handle_manage_urls(message: Message):
 @dp.message(F.text == "🚀 Запуск парсера")
 async def handle_run_parser(message: Message):
     """Handle Run Parser button (Developer only)"""
-    db = SessionLocal()
-    user = db.query(User).filter(User.telegram_id == message.from_user.id).first()
-    db.close()
-    
-    if not (user and user.is_developer):
+    if not check_developer(message.from_user.id):
         return
         
     await message.answer("⚡ Парсер запущен в фоновом режиме. Я сообщу о результатах!")
@@ -21,34 +21,36 @@ def get_main_keyboard(is_developer: bool = False) -> ReplyKeyboardMarkup:
     return builder.as_markup(resize_keyboard=True, placeholder="Выберите действие...")
 
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
-from aiogram.utils.keyboard import InlineKeyboardBuilder
+
+# Static button labels, resolved once at import
+LIKE_TEXT = {True: "❤️ В избранном", False: "🤍 В избранное"}
+SORT_TEXT = {"score": "📊 Сорт: Баллы", "views": "👁️ Сорт: Просмотры"}
+NEXT_SORT = {"score": "views", "views": "score"}
 
 def get_offer_inline_keyboard(offer_id: int, offer_url: str, current_index: int, total_count: int, is_favorite: bool = False, sort_by: str = "score") -> InlineKeyboardMarkup:
     """Create inline keyboard for offer navigation and interaction"""
-    builder = InlineKeyboardBuilder()
-    
-    # Interaction buttons
-    like_text = "❤️ В избранном" if is_favorite else "🤍 В избранное"
-    builder.row(
-        InlineKeyboardButton(text="👎 Пропустить", callback_data=f"interact:dislike:{offer_id}:{current_index}:{sort_by}"),
-        InlineKeyboardButton(text=like_text, callback_data=f"interact:like:{offer_id}:{current_index}:{sort_by}")
-    )
-    
-    # Navigation buttons
+    # Layout is fixed, so the markup is built directly instead of going
+    # through InlineKeyboardBuilder on every callback
     prev_index = (current_index - 1) % total_count
     next_index = (current_index + 1) % total_count
     
-    builder.row(
-        InlineKeyboardButton(text="⬅️ Назад", callback_data=f"browse:{prev_index}:{sort_by}"),
-        InlineKeyboardButton(text=f"{current_index + 1}/{total_count}", callback_data="ignore"),
-        InlineKeyboardButton(text="Вперед ➡️", callback_data=f"browse:{next_index}:{sort_by}")
-    )
-
-    # Sort toggle
-    sort_text = "📊 Сорт: Баллы" if sort_by == "score" else "👁️ Сорт: Просмотры"
-    new_sort = "views" if sort_by == "score" else "score"
-    builder.row(
-        InlineKeyboardButton(text=sort_text, callback_data=f"sort:{new_sort}:{current_index}")
-    )
-    
-    return builder.as_markup()
+    return InlineKeyboardMarkup(inline_keyboard=[
+        # Interaction buttons
+        [
+            InlineKeyboardButton(text="👎 Пропустить", callback_data=f"interact:dislike:{offer_id}:{current_index}:{sort_by}"),
+            InlineKeyboardButton(text=LIKE_TEXT[bool(is_favorite)], callback_data=f"interact:like:{offer_id}:{current_index}:{sort_by}")
+        ],
+        # Navigation buttons
+        [
+            InlineKeyboardButton(text="⬅️ Назад", callback_data=f"browse:{prev_index}:{sort_by}"),
+            InlineKeyboardButton(text=f"{current_index + 1}/{total_count}", callback_data="ignore"),
+            InlineKeyboardButton(text="Вперед ➡️", callback_data=f"browse:{next_index}:{sort_by}")
+        ],
+        # Sort toggle
+        [
+            InlineKeyboardButton(
+                text=SORT_TEXT.get(sort_by, SORT_TEXT["views"]),
+                callback_data=f"sort:{NEXT_SORT.get(sort_by, 'score')}:{current_index}"
+            )
+        ]
+    ])
@@ -4,7 +4,6 @@ import logging
 import sys
 from aiogram import Bot
 from sqlalchemy import func
-from dotenv import load_dotenv
 
 # Add project root to sys.path
 current_dir = os.path.dirname(os.path.abspath(__file__))
@@ -12,6 +11,7 @@ project_root = os.path.dirname(os.path.dirname(current_dir))
 if project_root not in sys.path:
     sys.path.insert(0, project_root)
 
+from src.core.config import Config
 from src.core.database import SessionLocal, Offer, OfferDetail, OfferScore, OfferPrice, User
 
 # Configure logging
@@ -21,10 +21,7 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-# Load environment variables
-load_dotenv(os.path.join(project_root, ".env"))
-
-TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
+TOKEN = Config.TELEGRAM_BOT_TOKEN
 
 async def send_high_score_notifications():
     """Send notifications for new high-scored apartments to all active users."""
@@ -32,13 +29,17 @@ async def send_high_score_notifications():
         logger.error("❌ TELEGRAM_BOT_TOKEN not found. Notifications skipped.")
         return
 
-    bot = Bot(token=TOKEN)
+    bot = None
     db = SessionLocal()
+    notified_ids = []
     
     try:
         # 1. Fetch active users to notify
-        active_users = db.query(User).filter(User.is_active == True).all()
-        if not active_users:
+        active_user_ids = [
+            telegram_id for (telegram_id,) in
+            db.query(User.telegram_id).filter(User.is_active == True).all()
+        ]
+        if not active_user_ids:
             logger.info("ℹ️ No active users found to notify.")
             return
 
@@ -54,7 +55,16 @@ async def send_high_score_notifications():
 
         # 3. Fetch high-scored offers that haven't been notified yet (Score >= 130)
         results = (
-            db.query(Offer, OfferDetail, OfferScore, OfferPrice)
+            db.query(
+                Offer.id, Offer.cian_id, Offer.url,
+                OfferDetail.total_area, OfferDetail.rooms_count,
+                OfferDetail.floor, OfferDetail.floors_count,
+                OfferDetail.metro_name, OfferDetail.metro_time, OfferDetail.metro_transport,
+                OfferDetail.extra_attributes,
+                OfferScore.total_score, OfferScore.discount_pct,
+                OfferScore.quality_score, OfferScore.market_interest_score,
+                OfferPrice.price, OfferPrice.currency
+            )
             .join(OfferDetail, Offer.id == OfferDetail.offer_id)
             .join(OfferScore, Offer.id == OfferScore.offer_id)
             .join(OfferPrice, Offer.id == OfferPrice.offer_id)
@@ -74,10 +84,11 @@ async def send_high_score_notifications():
             return
 
         logger.info(f"🔔 Found {len(results)} new high-scored apartments. Sending notifications...")
+        bot = Bot(token=TOKEN)
 
-        for offer, detail, score, price in results:
+        for row in results:
             # Determine Tier
-            if score.total_score >= 160:
+            if row.total_score >= 160:
                 tier_icon = "🔥🔥🔥"
                 tier_name = "ТОП ВАРИАНТ"
             else:
@@ -85,49 +96,58 @@ async def send_high_score_notifications():
                 tier_name = "ВЫСОКИЙ БАЛЛ"
 
             address = "Адрес не указан"
-            if detail.extra_attributes and isinstance(detail.extra_attributes, dict):
-                address = detail.extra_attributes.get('address', address)
+            if row.extra_attributes and isinstance(row.extra_attributes, dict):
+                address = row.extra_attributes.get('address', address)
 
             message_text = (
                 f"{tier_icon} *{tier_name}!*\n"
-                f"🎯 *Общий балл: {score.total_score}/200*\n"
+                f"🎯 *Общий балл: {row.total_score}/200*\n"
                 f"───────────────────\n"
-                f"💰 *Цена:* {price.price:,} {price.currency}\n"
-                f"📉 *Скидка от рынка:* {score.discount_pct}%" if score.discount_pct else "N/A"
-                f"\n📐 *Площадь:* {detail.total_area} м² ({detail.rooms_count}-комн)\n"
-                f"🏢 *Этаж:* {detail.floor}/{detail.floors_count}\n"
-                f"🚇 *Метро:* {detail.metro_name} ({detail.metro_time} мин {detail.metro_transport})\n"
+                f"💰 *Цена:* {row.price:,} {row.currency}\n"
+                f"📉 *Скидка от рынка:* {row.discount_pct}%" if row.discount_pct else "N/A"
+                f"\n📐 *Площадь:* {row.total_area} м² ({row.rooms_count}-комн)\n"
+                f"🏢 *Этаж:* {row.floor}/{row.floors_count}\n"
+                f"🚇 *Метро:* {row.metro_name} ({row.metro_time} мин {row.metro_transport})\n"
                 f"📍 *Адрес:* {address}\n"
                 f"───────────────────\n"
-                f"✨ *Качество:* {score.quality_score}/100\n"
-                f"🔥 *Интерес:* {score.market_interest_score}/100\n"
+                f"✨ *Качество:* {row.quality_score}/100\n"
+                f"🔥 *Интерес:* {row.market_interest_score}/100\n"
                 f"───────────────────\n"
-                f"🌐 [Посмотреть на Cian]({offer.url})\n"
+                f"🌐 [Посмотреть на Cian]({row.url})\n"
             )
 
             # Send to all active users
-            for user in active_users:
+            for telegram_id in active_user_ids:
                 try:
                     await bot.send_message(
-                        chat_id=user.telegram_id,
+                        chat_id=telegram_id,
                         text=message_text,
                         parse_mode="Markdown",
                         disable_web_page_preview=False
                     )
-                    logger.info(f"✅ Notification sent to user {user.telegram_id} for offer {offer.cian_id}")
+                    logger.info(f"✅ Notification sent to user {telegram_id} for offer {row.cian_id}")
                 except Exception as e:
-                    logger.error(f"❌ Failed to send notification to user {user.telegram_id}: {e}")
+                    logger.error(f"❌ Failed to send notification to user {telegram_id}: {e}")
 
-            # Mark as notified
-            score.is_notified = True
-            db.commit()
+            notified_ids.append(row.id)
 
     except Exception as e:
         logger.error(f"❌ Error in send_high_score_notifications: {e}")
         db.rollback()
     finally:
+        # Mark everything sent so far as notified in one statement
+        if notified_ids:
+            try:
+                db.query(OfferScore).filter(OfferScore.offer_id.in_(notified_ids)).update(
+                    {OfferScore.is_notified: True}, synchronize_session=False
+                )
+                db.commit()
+            except Exception as e:
+                logger.error(f"❌ Failed to mark offers as notified: {e}")
+                db.rollback()
         db.close()
-        await bot.session.close()
+        if bot:
+            await bot.session.close()
 
 if __name__ == "__main__":
     asyncio.run(send_high_score_notifications())
@@ -81,6 +81,7 @@ CREATE TABLE IF NOT EXISTS offer_scores (
     total_score INTEGER DEFAULT 0,
     discount_pct FLOAT,
     calculated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    is_notified BOOLEAN DEFAULT FALSE,
     CONSTRAINT valid_scores CHECK (
         price_score >= 0 AND price_score <= 45 AND
         metro_score >= 0 AND metro_score <= 30 AND
@@ -91,13 +92,18 @@ CREATE TABLE IF NOT EXISTS offer_scores (
     )
 );
 
+-- Added after the initial release; keeps existing databases in sync
+ALTER TABLE offer_scores ADD COLUMN IF NOT EXISTS is_notified BOOLEAN DEFAULT FALSE;
+
 -- 7. Performance Indexes
-CREATE INDEX IF NOT EXISTS idx_offers_cian_id ON offers(cian_id);
 CREATE INDEX IF NOT EXISTS idx_offers_search_url_id ON offers(search_url_id);
-CREATE INDEX IF NOT EXISTS idx_prices_offer_id ON offer_prices(offer_id);
-CREATE INDEX IF NOT EXISTS idx_stats_offer_id ON offer_stats(offer_id);
+-- Latest price / stats per offer
+CREATE INDEX IF NOT EXISTS idx_prices_offer_scraped ON offer_prices(offer_id, scraped_at DESC);
+CREATE INDEX IF NOT EXISTS idx_stats_offer_scraped ON offer_stats(offer_id, scraped_at DESC);
 CREATE INDEX IF NOT EXISTS idx_offer_scores_total ON offer_scores(total_score DESC);
 CREATE INDEX IF NOT EXISTS idx_offer_scores_quality ON offer_scores(quality_score DESC);
+-- Pending high-score notifications
+CREATE INDEX IF NOT EXISTS idx_offer_scores_unnotified ON offer_scores(total_score) WHERE is_notified = FALSE;
 
 -- 8. Bot Users
 CREATE TABLE IF NOT EXISTS users (
@@ -122,10 +128,8 @@ CREATE TABLE IF NOT EXISTS user_interactions (
     UNIQUE(user_id, offer_id)
 );
 
-CREATE INDEX IF NOT EXISTS idx_user_interactions_user_id ON user_interactions(user_id);
 CREATE INDEX IF NOT EXISTS idx_user_interactions_offer_id ON user_interactions(offer_id);
-
-CREATE INDEX IF NOT EXISTS idx_users_telegram_id ON users(telegram_id);
+CREATE INDEX IF NOT EXISTS idx_user_interactions_user_type ON user_interactions(user_id, interaction_type);
 
 -- 9. Metro Ban List
 CREATE TABLE IF NOT EXISTS banned_metros (
@@ -134,4 +138,35 @@ CREATE TABLE IF NOT EXISTS banned_metros (
     created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
 );
 
-CREATE INDEX IF NOT EXISTS idx_banned_metros_name ON banned_metros(name);
+-- 10. Redundant indexes from earlier versions: already covered by the UNIQUE
+-- constraints on offers.cian_id, users.telegram_id, banned_metros.name and
+-- user_interactions(user_id, offer_id), or by the (offer_id, scraped_at) indexes
+DROP INDEX IF EXISTS idx_offers_cian_id;
+DROP INDEX IF EXISTS idx_users_telegram_id;
+DROP INDEX IF EXISTS idx_banned_metros_name;
+DROP INDEX IF EXISTS idx_user_interactions_user_id;
+DROP INDEX IF EXISTS idx_prices_offer_id;
+DROP INDEX IF EXISTS idx_stats_offer_id;
+
+-- 11. Foreign keys created by earlier versions (or by create_tables()) had no
+-- ON DELETE rule; the models rely on the database to null/delete children
+ALTER TABLE offers
+    DROP CONSTRAINT IF EXISTS offers_search_url_id_fkey,
+    ADD CONSTRAINT offers_search_url_id_fkey
+        FOREIGN KEY (search_url_id) REFERENCES search_urls(id) ON DELETE SET NULL;
+ALTER TABLE offer_details
+    DROP CONSTRAINT IF EXISTS offer_details_offer_id_fkey,
+    ADD CONSTRAINT offer_details_offer_id_fkey
+        FOREIGN KEY (offer_id) REFERENCES offers(id) ON DELETE CASCADE;
+ALTER TABLE offer_prices
+    DROP CONSTRAINT IF EXISTS offer_prices_offer_id_fkey,
+    ADD CONSTRAINT offer_prices_offer_id_fkey
+        FOREIGN KEY (offer_id) REFERENCES offers(id) ON DELETE CASCADE;
+ALTER TABLE offer_stats
+    DROP CONSTRAINT IF EXISTS offer_stats_offer_id_fkey,
+    ADD CONSTRAINT offer_stats_offer_id_fkey
+        FOREIGN KEY (offer_id) REFERENCES offers(id) ON DELETE CASCADE;
+ALTER TABLE offer_scores
+    DROP CONSTRAINT IF EXISTS offer_scores_offer_id_fkey,
+    ADD CONSTRAINT offer_scores_offer_id_fkey
+        FOREIGN KEY (offer_id) REFERENCES offers(id) ON DELETE CASCADE;
@@ -19,6 +19,7 @@ Examples:
     python detail_parser.py --limit 20 --prioritize-new
 """
 
+import argparse
 import os
 import sys
 import webbrowser
@@ -27,9 +28,9 @@ import re
 import time
 import random
 import json
-from datetime import datetime, timedelta
-from bs4 import BeautifulSoup
-from fake_useragent import UserAgent
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import cast, func, or_
+from sqlalchemy.dialects.postgresql import JSONB, insert as pg_insert
 
 try:
     from curl_cffi import requests as curl_requests
@@ -43,30 +44,40 @@ if project_root not in sys.path:
     sys.path.insert(0, project_root)
 
 from src.core.database import SessionLocal, Offer, OfferDetail, OfferPrice, OfferStat
+from src.parser.browser import BROWSER_HEADERS, BROWSER_USER_AGENT
+
+# Page texts meaning the offer is gone (404 or not found indicators)
+REMOVED_INDICATORS = (
+    'объявление не найдено',
+    'страница не найдена',
+    'объявление снято с публикации',
+    'квартира сдана',
+    'квартира продана',
+)
+# One case-insensitive scan instead of lowercasing the whole page
+REMOVED_RE = re.compile('|'.join(map(re.escape, REMOVED_INDICATORS)), re.IGNORECASE)
+
+# Bot-check wording on the captcha page
+ROBOT_RE = re.compile('робот', re.IGNORECASE)
+
+# Cian's "N просмотров, M за сегодня" stats string
+VIEWS_RE = re.compile(r'(\d+)\s+просмотров?,\s+(\d+)\s+за\s+сегодня')
+VIEWS_TOTAL_RE = re.compile(r'(\d+)\s+просмотров?')
+
+# Parsed fields stored as-is in offer_details
+DETAIL_FIELDS = (
+    'description', 'total_area', 'living_area', 'kitchen_area',
+    'floor', 'floors_count', 'build_year', 'material_type',
+    'metro_name', 'metro_time', 'metro_transport',
+    'rooms_count', 'property_type', 'balcony_count', 'loggia_count',
+    'is_auction', 'deposit_paid', 'extra_attributes',
+)
 
 
 class DetailParser:
     def __init__(self):
-        self.ua = UserAgent()
-        # Set a consistent User-Agent that matches the user's browser exactly
-        self.current_ua = 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/145.0.0.0 Safari/537.36'
-        self.headers = {
-            'User-Agent': self.current_ua,
-            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/apng,*/*;q=0.8,application/signed-exchange;v=b3;q=0.7',
-            'Accept-Language': 'ru-RU,ru;q=0.9,en-US;q=0.8,en;q=0.7',
-            'Referer': 'https://www.cian.ru/',
-            'Cache-Control': 'max-age=0',
-            'Sec-Ch-Ua': '"Not_A Brand";v="99", "Chromium";v="145", "Google Chrome";v="145"',
-            'Sec-Ch-Ua-Mobile': '?0',
-            'Sec-Ch-Ua-Platform': '"macOS"',
-            'Upgrade-Insecure-Requests': '1',
-            'Sec-Fetch-Dest': 'document',
-            'Sec-Fetch-Mode': 'navigate',
-            'Sec-Fetch-Site': 'same-origin',
-            'Sec-Fetch-User': '?1',
-            'DNT': '1',
-            'Connection': 'keep-alive'
-        }
+        self.current_ua = BROWSER_USER_AGENT
+        self.headers = dict(BROWSER_HEADERS)
         
         # Use curl_cffi Session for better TLS fingerprinting
         if curl_requests:
@@ -112,9 +123,10 @@ class DetailParser:
             # Parse "key=value; key2=value2" string
             cookie_dict = {}
             for item in cookie_data.split(';'):
-                if '=' in item:
-                    name, value = item.split('=', 1)
-                    cookie_dict[name.strip()] = value.strip()
+                name, sep, value = item.partition('=')
+                name = name.strip()
+                if sep and name:
+                    cookie_dict[name] = value.strip()
             
             self.session.cookies.update(cookie_dict)
             print(f"  🍪 Loaded {len(cookie_dict)} cookies from cookies.txt")
@@ -166,7 +178,7 @@ class DetailParser:
                     # Successful page, writing back cookies is done at the end of get_html
                     pass
                 # Check for real captcha or bot detection markers
-                elif 'checkbox-captcha-form' in html or 'captcha-container' in html or 'робот' in html.lower():
+                elif 'checkbox-captcha-form' in html or 'captcha-container' in html or ROBOT_RE.search(html):
                     print(f"  ⚠️  REAL CAPTCHA DETECTED on attempt {attempt + 1}")
                     
                     # Manual intervention mechanism
@@ -219,16 +231,7 @@ class DetailParser:
             return 'CAPTCHA'
         
         # Check if offer was removed (404 or not found indicators)
-        indicators = [
-            'объявление не найдено', 
-            'страница не найдена', 
-            'объявление снято с публикации',
-            'квартира сдана',
-            'квартира продана'
-        ]
-        
-        lower_html = html.lower()
-        if any(ind in lower_html for ind in indicators):
+        if REMOVED_RE.search(html):
             print(f"  ❌ Offer not found or removed (Found indicator)")
             return 'REMOVED'
         
@@ -304,12 +307,12 @@ class DetailParser:
             views_today = None
             
             if views_str:
-                views_match = re.search(r'(\d+)\s+просмотров?,\s+(\d+)\s+за\s+сегодня', views_str)
+                views_match = VIEWS_RE.search(views_str)
                 if views_match:
                     views_total = int(views_match.group(1))
                     views_today = int(views_match.group(2))
                 else:
-                    views_match_total = re.search(r'(\d+)\s+просмотров?', views_str)
+                    views_match_total = VIEWS_TOTAL_RE.search(views_str)
                     if views_match_total:
                         views_total = int(views_match_total.group(1))
             
@@ -328,17 +331,22 @@ class DetailParser:
                 is_auction = True
             
             # Check in bargain terms for auction details
-            if bargain_terms.get('auction'):
+            auction_terms = bargain_terms.get('auction')
+            if auction_terms:
                 is_auction = True
-                if isinstance(bargain_terms.get('auction'), dict):
-                    deposit_paid = bargain_terms.get('auction').get('depositPaid')
+                if isinstance(auction_terms, dict):
+                    deposit_paid = auction_terms.get('depositPaid')
+
+            total_area = offer.get('totalArea')
+            living_area = offer.get('livingArea')
+            kitchen_area = offer.get('kitchenArea')
 
             # Build details dict
             details = {
                 'description': offer.get('description'),
-                'total_area': float(offer.get('totalArea')) if offer.get('totalArea') else None,
-                'living_area': float(offer.get('livingArea')) if offer.get('livingArea') else None,
-                'kitchen_area': float(offer.get('kitchenArea')) if offer.get('kitchenArea') else None,
+                'total_area': float(total_area) if total_area else None,
+                'living_area': float(living_area) if living_area else None,
+                'kitchen_area': float(kitchen_area) if kitchen_area else None,
                 'floor': offer.get('floorNumber'),
                 'floors_count': building.get('floorsCount'),
                 'build_year': building.get('buildYear'),
@@ -386,37 +394,31 @@ class DetailParser:
         """Save or update offer details and history"""
         try:
             db = self.db_session
-            now = datetime.now()
             
             # Update offer's updated_at timestamp
-            offer = db.query(Offer).filter(Offer.id == offer_id).first()
-            if offer:
-                offer.updated_at = now
+            db.query(Offer).filter(Offer.id == offer_id).update(
+                {Offer.updated_at: func.now()}, synchronize_session=False
+            )
             
             # Upsert offer details
-            offer_detail = db.query(OfferDetail).filter(OfferDetail.offer_id == offer_id).first()
-            if not offer_detail:
-                offer_detail = OfferDetail(offer_id=offer_id)
-                db.add(offer_detail)
-            
-            offer_detail.description = detail_data['description']
-            offer_detail.total_area = detail_data['total_area']
-            offer_detail.living_area = detail_data['living_area']
-            offer_detail.kitchen_area = detail_data['kitchen_area']
-            offer_detail.floor = detail_data['floor']
-            offer_detail.floors_count = detail_data['floors_count']
-            offer_detail.build_year = detail_data['build_year']
-            offer_detail.material_type = detail_data['material_type']
-            offer_detail.metro_name = detail_data['metro_name']
-            offer_detail.metro_time = detail_data['metro_time']
-            offer_detail.metro_transport = detail_data['metro_transport']
-            offer_detail.rooms_count = detail_data['rooms_count']
-            offer_detail.property_type = detail_data['property_type']
-            offer_detail.balcony_count = detail_data['balcony_count']
-            offer_detail.loggia_count = detail_data['loggia_count']
-            offer_detail.is_auction = detail_data['is_auction']
-            offer_detail.deposit_paid = detail_data['deposit_paid']
-            offer_detail.extra_attributes = detail_data['extra_attributes']
+            stmt = pg_insert(OfferDetail).values(
+                offer_id=offer_id,
+                **{field: detail_data[field] for field in DETAIL_FIELDS}
+            )
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[OfferDetail.offer_id],
+                set_={field: stmt.excluded[field] for field in DETAIL_FIELDS},
+                # Skip rewriting the row when nothing changed. extra_attributes
+                # is compared as jsonb: tables created before the model used
+                # JSONB hold plain json, which has no equality operator
+                where=or_(*(
+                    cast(getattr(OfferDetail, field), JSONB).is_distinct_from(cast(stmt.excluded[field], JSONB))
+                    if field == 'extra_attributes' else
+                    getattr(OfferDetail, field).is_distinct_from(stmt.excluded[field])
+                    for field in DETAIL_FIELDS
+                ))
+            )
+            db.execute(stmt)
             
             # Insert price history
             if detail_data.get('price'):
@@ -448,11 +450,12 @@ class DetailParser:
         """Mark offer as inactive (removed from Cian)"""
         try:
             db = self.db_session
-            offer = db.query(Offer).filter(Offer.id == offer_id).first()
-            if offer:
-                offer.is_active = False
-                offer.updated_at = datetime.now()
-                db.commit()
+            updated = db.query(Offer).filter(Offer.id == offer_id).update(
+                {Offer.is_active: False, Offer.updated_at: func.now()},
+                synchronize_session=False
+            )
+            db.commit()
+            if updated:
                 self.stats['inactive_offers'] += 1
                 print(f"  🔴 Marked as inactive")
         except Exception as e:
@@ -460,10 +463,12 @@ class DetailParser:
             self.db_session.rollback()
 
     def get_offers_to_update(self, limit=10, max_age_hours=None, prioritize_new=False):
-        """Query offers that need updating"""
+        """Query (id, cian_id, url) of offers that need updating"""
         db = self.db_session
         
-        query = db.query(Offer).filter(Offer.is_active == True)
+        # Plain rows: ORM instances would be expired by every commit in the
+        # update loop and reloaded one by one on the next attribute access
+        query = db.query(Offer.id, Offer.cian_id, Offer.url).filter(Offer.is_active == True)
         
         if prioritize_new:
             # Prioritize offers never updated
@@ -473,7 +478,7 @@ class DetailParser:
             )
         elif max_age_hours:
             # Filter by age threshold
-            threshold = datetime.now() - timedelta(hours=max_age_hours)
+            threshold = datetime.now(timezone.utc) - timedelta(hours=max_age_hours)
             query = query.filter(
                 or_(
                     Offer.updated_at.is_(None),
@@ -509,12 +514,15 @@ class DetailParser:
         print(f"Found {len(offers)} offers to update\\n")
         
         # Process each offer
+        total = len(offers)
+        stats = self.stats
+        parse_detail_page = self.parse_detail_page
         for idx, offer in enumerate(offers, 1):
-            print(f"[{idx}/{len(offers)}] Processing cian_id={offer.cian_id}")
-            self.stats['total_processed'] += 1
+            print(f"[{idx}/{total}] Processing cian_id={offer.cian_id}")
+            stats['total_processed'] += 1
             
             # Parse details
-            detail_data = self.parse_detail_page(offer.url)
+            detail_data = parse_detail_page(offer.url)
             
             if detail_data == 'REMOVED':
                 # Offer was removed
@@ -527,7 +535,7 @@ class DetailParser:
                 self.save_offer_details(offer.id, detail_data)
             else:
                 # Parse failed
-                self.stats['failed_parses'] += 1
+                stats['failed_parses'] += 1
                 print(f"  ⚠️  Skipping due to parse failure")
             
             print()  # Blank line between offers
@@ -537,15 +545,17 @@ class DetailParser:
 
     def print_summary(self):
         """Print update statistics"""
-        print("=" * 60)
-        print("UPDATE SUMMARY")
-        print("=" * 60)
-        print(f"📊 Total processed: {self.stats['total_processed']}")
-        print(f"✅ Successful updates: {self.stats['successful_updates']}")
-        print(f"🔴 Marked inactive: {self.stats['inactive_offers']}")
-        print(f"❌ Failed parses: {self.stats['failed_parses']}")
-        print(f"🌐 Network errors: {self.stats['network_errors']}")
-        print("=" * 60)
+        print("\n".join([
+            "=" * 60,
+            "UPDATE SUMMARY",
+            "=" * 60,
+            f"📊 Total processed: {self.stats['total_processed']}",
+            f"✅ Successful updates: {self.stats['successful_updates']}",
+            f"🔴 Marked inactive: {self.stats['inactive_offers']}",
+            f"❌ Failed parses: {self.stats['failed_parses']}",
+            f"🌐 Network errors: {self.stats['network_errors']}",
+            "=" * 60,
+        ]))
 
     def __del__(self):
         """Close database session"""
@@ -6,7 +6,8 @@ fetching detailed information. It's designed for bulk collection with minimal
 delays to efficiently build the offer database.
 
 Usage:
-    python listing_parser.py --url URL [--pages N] [--max-offers N]
+    python listing_parser.py --url URL [--pages N] [--max-offers N] [--fast-scan]
+    python listing_parser.py --check-scan saved_page.html
 
 Example:
     python listing_parser.py \\
@@ -15,15 +16,22 @@ Example:
         --max-offers 100
 """
 
+import argparse
 import os
 import sys
 import requests
 import re
 import time
 import random
-from datetime import datetime
-from bs4 import BeautifulSoup
-from fake_useragent import UserAgent
+from html import unescape
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import lxml.html
+from lxml import etree
+from sqlalchemy import func, insert, literal_column
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 
 # Add project root to sys.path
 current_dir = os.path.dirname(os.path.abspath(__file__))
@@ -31,31 +39,109 @@ project_root = os.path.dirname(os.path.dirname(current_dir))
 if project_root not in sys.path:
     sys.path.insert(0, project_root)
 
+from src.core.config import Config
 from src.core.database import SessionLocal, Offer, SearchUrl
+from src.parser.browser import BROWSER_HEADERS
+
+# Maximum number of offers sent in one INSERT ... ON CONFLICT statement
+UPSERT_CHUNK_SIZE = 500
+
+# All pages come from one host; keep a small keep-alive pool and retry
+# transient gateway errors instead of dropping the page
+HTTP_POOL_SIZE = 4
+HTTP_RETRY = Retry(
+    total=2,
+    backoff_factor=2,
+    status_forcelist=(502, 503, 504),
+    allowed_methods=('GET',)
+)
+REQUEST_TIMEOUT = 30
+
+# Offer id in a flat URL
+FLAT_ID_RE = re.compile(r'/flat/(\d+)')
+CAPTCHA_RE = re.compile('captcha', re.IGNORECASE)
+
+# Offer cards on a listing page and the flat links inside a card
+CARD_XPATH = etree.XPath('//*[@data-name="CardComponent"]')
+CARD_LINK_XPATH = etree.XPath(
+    './/a[starts-with(@href, "https://www.cian.ru/sale/flat/")'
+    ' or starts-with(@href, "/sale/flat/")]/@href',
+    smart_strings=False  # Plain str: queued URLs must not keep the page tree alive
+)
+
+# Fast scan: card start marker and flat links in the raw card markup
+CARD_MARKER = 'data-name="CardComponent"'
+# Open/close tags used to find where a card ends; cards are <article>
+# elements, any other tag name goes through the generic pattern
+CARD_TAG_RE = re.compile(r'<(/?)article(?=[\s/>])', re.IGNORECASE)
+ANY_TAG_RE = re.compile(r'<(/?)([A-Za-z][\w-]*)(?=[\s/>])')
+CARD_LINK_RE = re.compile(r'href="((?:https://www\.cian\.ru)?/sale/flat/[^"]*)"')
+
+
+def page_url_prefix(start_url):
+    """Return start_url without its page parameter, ending in 'p=' for the page number"""
+    parts = urlsplit(start_url)
+    query = urlencode([
+        (key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+        if key != 'p'
+    ])
+    query = f"{query}&p=" if query else "p="
+    return urlunsplit(parts._replace(query=query, fragment=''))
+
+
+def scan_cards(html):
+    """Split raw page HTML into card chunks, each bounded by the card's own element"""
+    chunks = []
+    pos = html.find(CARD_MARKER)
+    while pos != -1:
+        # The marker is an attribute: the card starts at its opening tag and
+        # ends at the matching close tag, so text after a card (footer,
+        # similar offers) never leaks into it
+        start = html.rfind('<', 0, pos)
+        tag = ANY_TAG_RE.match(html, start) if start != -1 else None
+        if not tag or tag.group(1):
+            pos = html.find(CARD_MARKER, pos + len(CARD_MARKER))
+            continue
+        tag_name = tag.group(2).lower()
+        if tag_name == 'article':
+            tags = CARD_TAG_RE.finditer(html, start)
+        else:
+            tags = (m for m in ANY_TAG_RE.finditer(html, start) if m.group(2).lower() == tag_name)
+        depth = 0
+        end = len(html)
+        for match in tags:
+            depth += -1 if match.group(1) else 1
+            if depth == 0:
+                end = html.find('>', match.end() - 1) + 1
+                break
+        chunks.append(html[start:end])
+        pos = html.find(CARD_MARKER, end)
+    return chunks
+
+
+def compare_card_scans(parser, html):
+    """Return (lxml_ids, fast_scan_ids): cian ids found by each card parsing path"""
+    tree = lxml.html.fromstring(html, parser=parser.html_parser)
+    lxml_ids = [data['cian_id'] for data in map(parser.parse_card, CARD_XPATH(tree)) if data]
+    fast_ids = [data['cian_id'] for data in map(parser.parse_card_html, scan_cards(html)) if data]
+    return lxml_ids, fast_ids
 
 
 class ListingParser:
-    def __init__(self):
-        self.ua = UserAgent()
-        self.headers = {
-            'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/145.0.0.0 Safari/537.36',
-            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/apng,*/*;q=0.8,application/signed-exchange;v=b3;q=0.7',
-            'Accept-Language': 'ru-RU,ru;q=0.9,en-US;q=0.8,en;q=0.7',
-            'Referer': 'https://www.cian.ru/',
-            'Cache-Control': 'max-age=0',
-            'Sec-Ch-Ua': '"Not_A Brand";v="99", "Chromium";v="145", "Google Chrome";v="145"',
-            'Sec-Ch-Ua-Mobile': '?0',
-            'Sec-Ch-Ua-Platform': '"macOS"',
-            'Upgrade-Insecure-Requests': '1',
-            'Sec-Fetch-Dest': 'document',
-            'Sec-Fetch-Mode': 'navigate',
-            'Sec-Fetch-Site': 'same-origin',
-            'Sec-Fetch-User': '?1',
-            'DNT': '1',
-            'Connection': 'keep-alive'
-        }
+    def __init__(self, fast_scan=None):
+        self.headers = dict(BROWSER_HEADERS)
         self.session = requests.Session()
         self.session.headers.update(self.headers)
+        adapter = HTTPAdapter(
+            pool_connections=1,
+            pool_maxsize=HTTP_POOL_SIZE,
+            max_retries=HTTP_RETRY
+        )
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        
+        # One HTML parser reused for every page (pages are parsed on this thread)
+        self.html_parser = lxml.html.HTMLParser(recover=True)
         self.db_session = SessionLocal()
         
         # Statistics
@@ -68,6 +154,9 @@ class ListingParser:
         
         # Current search URL being processed
         self.current_search_url_id = None
+        
+        # Read card links straight from the raw HTML instead of building a tree
+        self.fast_scan = Config.PARSER_FAST_SCAN if fast_scan is None else fast_scan
 
     def save_cookies(self):
         """Save current session cookies to cookies.txt"""
@@ -96,7 +185,7 @@ class ListingParser:
             print(f"Waiting {delay:.2f} seconds...")
             time.sleep(delay)
             
-            response = self.session.get(url, params=params)
+            response = self.session.get(url, params=params, timeout=REQUEST_TIMEOUT)
             response.raise_for_status()
             
             # Save cookies on success
@@ -107,52 +196,66 @@ class ListingParser:
             print(f"Error fetching {url}: {e}")
             return None
 
-    def parse_card(self, card_soup):
+    def parse_card(self, card):
         """Extract basic info from a listing card"""
-        try:
-            # Extract link & ID
-            link_el = card_soup.select_one('a[href^="https://www.cian.ru/sale/flat/"]')
-            if not link_el:
-                link_el = card_soup.select_one('a[href^="/sale/flat/"]')
-            
-            if not link_el:
-                return None
-                
-            link = link_el['href']
-            if link.startswith('/'):
-                link = f"https://www.cian.ru{link}"
-            
-            # Extract ID from link
-            match = re.search(r'/flat/(\d+)', link)
-            if not match:
-                return None
-                
-            cian_id = int(match.group(1))
-            
-            return {
-                'cian_id': cian_id,
-                'url': link
-            }
-        except Exception as e:
-            print(f"Error parsing card: {e}")
+        # Extract link & ID; cards without a flat link are skipped
+        links = CARD_LINK_XPATH(card)
+        if not links:
+            return None
+        
+        # Prefer an absolute link over a relative one
+        link = next((href for href in links if href.startswith('https://')), links[0])
+        if link.startswith('/'):
+            link = f"https://www.cian.ru{link}"
+        
+        # Extract ID from link
+        match = FLAT_ID_RE.search(link)
+        if not match:
+            return None
+        
+        return {
+            'cian_id': int(match.group(1)),
+            'url': link
+        }
+
+    def parse_card_html(self, chunk):
+        """Extract basic info from the raw markup of a listing card"""
+        links = CARD_LINK_RE.findall(chunk)
+        if not links:
+            return None
+        
+        # Prefer an absolute link over a relative one
+        link = unescape(next((href for href in links if href.startswith('https://')), links[0]))
+        if link.startswith('/'):
+            link = f"https://www.cian.ru{link}"
+        
+        match = FLAT_ID_RE.search(link)
+        if not match:
             return None
+        
+        return {
+            'cian_id': int(match.group(1)),
+            'url': link
+        }
 
     def get_or_create_search_url(self, url, name=None):
-        """Get existing SearchUrl or create new one"""
+        """Get existing SearchUrl or create new one, returning its (id, name)"""
         db = self.db_session
         
         # Try to find existing
-        search_url = db.query(SearchUrl).filter(SearchUrl.url == url).first()
+        search_url = db.query(SearchUrl.id, SearchUrl.name).filter(SearchUrl.url == url).first()
         
         if not search_url:
             # Create new
-            search_url = SearchUrl(
-                url=url,
-                name=name or url[:100]  # Use URL as name if not provided
-            )
-            db.add(search_url)
+            search_url = db.execute(
+                insert(SearchUrl)
+                .values(
+                    url=url,
+                    name=name or url[:100]  # Use URL as name if not provided
+                )
+                .returning(SearchUrl.id, SearchUrl.name)
+            ).one()
             db.commit()
-            db.refresh(search_url)
             print(f"📌 Created new search URL: {search_url.name} (ID: {search_url.id})")
         else:
             print(f"📌 Using existing search URL: {search_url.name} (ID: {search_url.id})")
@@ -163,10 +266,10 @@ class ListingParser:
         """Update last_parsed_at timestamp for search URL"""
         try:
             db = self.db_session
-            search_url = db.query(SearchUrl).filter(SearchUrl.id == search_url_id).first()
-            if search_url:
-                search_url.last_parsed_at = datetime.now()
-                db.commit()
+            db.query(SearchUrl).filter(SearchUrl.id == search_url_id).update(
+                {SearchUrl.last_parsed_at: func.now()}, synchronize_session=False
+            )
+            db.commit()
         except Exception as e:
             print(f"Warning: Could not update search URL timestamp: {e}")
 
@@ -177,35 +280,40 @@ class ListingParser:
             
         try:
             db = self.db_session
-            now = datetime.now()
             
-            for data in offers_data:
-                cian_id = data['cian_id']
-                url = data['url']
-                
-                # Check if offer exists
-                offer = db.query(Offer).filter(Offer.cian_id == cian_id).first()
-                
-                if offer:
-                    # Update existing offer
-                    offer.last_seen_at = now
-                    offer.is_active = True
-                    offer.search_url_id = self.current_search_url_id  # Update source
-                    self.stats['existing_offers'] += 1
-                else:
-                    # Create new offer
-                    offer = Offer(
-                        cian_id=cian_id,
-                        url=url,
-                        is_active=True,
-                        last_seen_at=now,
-                        search_url_id=self.current_search_url_id  # Link to source
-                    )
-                    db.add(offer)
-                    self.stats['new_offers'] += 1
+            # One row per cian_id: a single INSERT ... ON CONFLICT statement
+            # cannot touch the same row twice
+            rows = {
+                data['cian_id']: {
+                    'cian_id': data['cian_id'],
+                    'url': data['url'],
+                    'is_active': True,
+                    'last_seen_at': func.now(),  # Database clock
+                    'search_url_id': self.current_search_url_id  # Link to source
+                }
+                for data in offers_data
+            }
+            
+            # Insert new offers and refresh existing ones, one statement per
+            # chunk so a large batch never builds a single huge VALUES list
+            rows = list(rows.values())
+            inserted = 0
+            for start in range(0, len(rows), UPSERT_CHUNK_SIZE):
+                stmt = pg_insert(Offer).values(rows[start:start + UPSERT_CHUNK_SIZE])
+                stmt = stmt.on_conflict_do_update(
+                    index_elements=[Offer.cian_id],
+                    set_={
+                        'last_seen_at': stmt.excluded.last_seen_at,
+                        'is_active': True,
+                        'search_url_id': stmt.excluded.search_url_id  # Update source
+                    }
+                ).returning(literal_column('xmax = 0').label('inserted'))
+                inserted += sum(1 for row in db.execute(stmt) if row.inserted)
             
             # Commit batch
             db.commit()
+            self.stats['new_offers'] += inserted
+            self.stats['existing_offers'] += len(offers_data) - inserted
             self.stats['total_seen'] += len(offers_data)
             
         except Exception as e:
@@ -214,29 +322,34 @@ class ListingParser:
 
     def parse_listing_page(self, url):
         """Parse a single listing page and extract all offer cards"""
-        html = self.get_html(url)
+        return self.parse_listing_html(self.get_html(url))
+
+    def parse_listing_html(self, html):
+        """Extract all offer cards from fetched listing page HTML"""
         if not html:
             return []
         
-        soup = BeautifulSoup(html, 'html.parser')
-        cards = soup.select('[data-name="CardComponent"]')
-        
-        if not cards:
-            if 'captcha' in soup.text.lower():
+        # Cheap scan of the raw page before building the tree: captcha and
+        # empty pages carry no card markup at all
+        if CARD_MARKER not in html:
+            if CAPTCHA_RE.search(html):
                 print("⚠️  CAPTCHA DETECTED! Consider increasing delays.")
             else:
                 print("No cards found on this page.")
             return []
         
+        if self.fast_scan:
+            cards = scan_cards(html)
+            parse_card = self.parse_card_html
+        else:
+            tree = lxml.html.fromstring(html, parser=self.html_parser)
+            cards = CARD_XPATH(tree)
+            parse_card = self.parse_card
+        
         print(f"Found {len(cards)} cards on page")
         
-        offers_data = []
-        for card in cards:
-            card_data = self.parse_card(card)
-            if card_data:
-                offers_data.append(card_data)
-            else:
-                self.stats['failed_parses'] += 1
+        offers_data = [card_data for card_data in map(parse_card, cards) if card_data]
+        self.stats['failed_parses'] += len(cards) - len(offers_data)
         
         return offers_data
 
@@ -256,42 +369,55 @@ class ListingParser:
             print(f"Max offers: {max_offers}")
         print()
         
+        page_prefix = page_url_prefix(start_url)
         all_offers = []
+        seen_before = self.stats['total_seen']
+        collected = 0
+        pending_save = None
         
-        for page in range(1, max_pages + 1):
-            print(f"\\n📄 Processing page {page}/{max_pages}...")
-            
-            # Build page URL
-            if page == 1:
-                current_url = start_url
-            else:
-                if 'p=' in start_url:
-                    current_url = re.sub(r'p=\d+', f'p={page}', start_url)
-                else:
-                    separator = '&' if '?' in start_url else '?'
-                    current_url = f"{start_url}{separator}p={page}"
-            
-            # Parse page
-            offers_data = self.parse_listing_page(current_url)
-            
-            if offers_data:
-                all_offers.extend(offers_data)
+        # Batches are written by a background thread so the database round
+        # trip overlaps with the delay and fetch of the next page. The DB
+        # session is only touched by the writer until the executor is shut down.
+        # Pages are fetched by a second thread (which alone uses the HTTP
+        # session): once page N is parsed and the limit checked, the delay and
+        # download of page N+1 start while batch N is handed to the writer.
+        with ThreadPoolExecutor(max_workers=1) as writer, \
+                ThreadPoolExecutor(max_workers=1) as fetcher:
+            parse_listing_html = self.parse_listing_html
+            save_offers_batch = self.save_offers_batch
+            get_html = self.get_html
+            next_html = fetcher.submit(get_html, start_url)
+            for page in range(1, max_pages + 1):
+                print(f"\n📄 Processing page {page}/{max_pages}...")
+                
+                # Parse page
+                offers_data = parse_listing_html(next_html.result())
+                collected += len(offers_data)
+                
+                # Check max_offers limit before requesting another page
+                limit_reached = bool(max_offers) and seen_before + collected >= max_offers
+                if page < max_pages and not limit_reached:
+                    next_html = fetcher.submit(get_html, f"{page_prefix}{page + 1}")
+                
+                if offers_data:
+                    all_offers.extend(offers_data)
+                    
+                    # Save in batches of 50 for better performance
+                    if len(all_offers) >= 50:
+                        print(f"💾 Saving batch of {len(all_offers)} offers...")
+                        if pending_save:
+                            pending_save.result()
+                        pending_save = writer.submit(save_offers_batch, all_offers)
+                        all_offers = []
                 
-                # Save in batches of 50 for better performance
-                if len(all_offers) >= 50:
-                    print(f"💾 Saving batch of {len(all_offers)} offers...")
-                    self.save_offers_batch(all_offers)
-                    all_offers = []
+                if limit_reached:
+                    print(f"\n✅ Reached max_offers limit ({max_offers})")
+                    break
             
-            # Check max_offers limit
-            if max_offers and self.stats['total_seen'] >= max_offers:
-                print(f"\\n✅ Reached max_offers limit ({max_offers})")
-                break
-        
-        # Save remaining offers
-        if all_offers:
-            print(f"💾 Saving final batch of {len(all_offers)} offers...")
-            self.save_offers_batch(all_offers)
+            # Save remaining offers
+            if all_offers:
+                print(f"💾 Saving final batch of {len(all_offers)} offers...")
+                writer.submit(save_offers_batch, all_offers)
         
         # Update search URL timestamp
         self.update_search_url_timestamp(self.current_search_url_id)
@@ -301,7 +427,7 @@ class ListingParser:
 
     def print_summary(self):
         """Print collection statistics"""
-        print("\\n" + "=" * 60)
+        print("\n" + "=" * 60)
         print("COLLECTION SUMMARY")
         print("=" * 60)
         print(f"✅ Total offers processed: {self.stats['total_seen']}")
@@ -421,12 +547,33 @@ Examples:
         help='Human-readable name for this search URL (only used with --url)'
     )
     
+    parser.add_argument(
+        '--fast-scan',
+        action='store_true',
+        help='Find card links with a plain text scan instead of parsing the page tree'
+    )
+    
+    parser.add_argument(
+        '--check-scan',
+        type=str,
+        default=None,
+        metavar='FILE',
+        help='Check that --fast-scan finds the same offers as the tree parser in a saved listing page'
+    )
+    
     args = parser.parse_args()
     
     # Run parser
-    listing_parser = ListingParser()
+    listing_parser = ListingParser(fast_scan=args.fast_scan or None)
     
-    if args.all_sources:
+    if args.check_scan:
+        with open(args.check_scan, encoding='utf-8') as f:
+            lxml_ids, fast_ids = compare_card_scans(listing_parser, f.read())
+        if lxml_ids != fast_ids:
+            print(f"❌ Fast scan differs: tree parser {lxml_ids}, fast scan {fast_ids}")
+            sys.exit(1)
+        print(f"✅ Fast scan matches the tree parser ({len(lxml_ids)} offers)")
+    elif args.all_sources:
         # Multi-source mode
         listing_parser.run_all_sources(
             max_pages=args.pages,
@@ -23,6 +23,7 @@ import sys
 import time
 import os
 from datetime import datetime
+from sqlalchemy import func
 
 # Add project root to sys.path
 current_dir = os.path.dirname(os.path.abspath(__file__))
@@ -40,16 +41,18 @@ def get_database_stats():
     """Get current database statistics"""
     db = SessionLocal()
     try:
-        total_offers = db.query(Offer).count()
-        active_offers = db.query(Offer).filter(Offer.is_active == True).count()
-        updated_offers = db.query(Offer).filter(Offer.updated_at.isnot(None)).count()
-        new_offers = db.query(Offer).filter(Offer.updated_at.is_(None)).count()
+        row = db.query(
+            func.count(Offer.id).label('total'),
+            func.count(Offer.id).filter(Offer.is_active == True).label('active'),
+            func.count(Offer.updated_at).label('updated'),
+            func.count(Offer.id).filter(Offer.updated_at.is_(None)).label('new')
+        ).one()
         
         return {
-            'total': total_offers,
-            'active': active_offers,
-            'updated': updated_offers,
-            'new': new_offers
+            'total': row.total,
+            'active': row.active,
+            'updated': row.updated,
+            'new': row.new
         }
     finally:
         db.close()
@@ -57,12 +60,25 @@ def get_database_stats():
 
 def print_header(title):
     """Print formatted header"""
-    print("\\n" + "=" * 70)
-    print(f"  {title}")
-    print("=" * 70 + "\\n")
+    print("\n".join(["", "=" * 70, f"  {title}", "=" * 70, ""]))
 
 
-def run_workflow(args):
+def print_database_status(title, stats):
+    """Print database statistics block in a single write"""
+    print("\n".join([
+        "",
+        "─" * 70,
+        title,
+        "─" * 70,
+        f"📊 Total offers in DB: {stats['total']}",
+        f"✅ Active offers: {stats['active']}",
+        f"🆕 New offers (no details): {stats['new']}",
+        f"📝 Updated offers (with details): {stats['updated']}",
+        "─" * 70,
+    ]))
+
+
+def run_workflow(args, full_rescore=True):
     """Execute the full parsing workflow"""
     
     print_header("CIAN PARSER WORKFLOW")
@@ -93,14 +109,7 @@ def run_workflow(args):
     # Show statistics after listing collection
     stats_after_listing = get_database_stats()
     
-    print("\\n" + "─" * 70)
-    print("DATABASE STATUS AFTER LISTING COLLECTION")
-    print("─" * 70)
-    print(f"📊 Total offers in DB: {stats_after_listing['total']}")
-    print(f"✅ Active offers: {stats_after_listing['active']}")
-    print(f"🆕 New offers (no details): {stats_after_listing['new']}")
-    print(f"📝 Updated offers (with details): {stats_after_listing['updated']}")
-    print("─" * 70)
+    print_database_status("DATABASE STATUS AFTER LISTING COLLECTION", stats_after_listing)
     
     # Check if we should skip detail updates
     if args.listing_only:
@@ -158,7 +167,7 @@ def run_workflow(args):
     # Phase 3: Scoring
     print_header("PHASE 3: SCORING CALCULATION")
     try:
-        calculate_scores()
+        calculate_scores(incremental=args.incremental_scores or not full_rescore)
         show_statistics()
     except Exception as e:
         print(f"⚠️  Scoring calculation failed: {e}")
@@ -166,14 +175,7 @@ def run_workflow(args):
     # Final statistics
     stats_final = get_database_stats()
     
-    print("\\n" + "─" * 70)
-    print("FINAL DATABASE STATUS")
-    print("─" * 70)
-    print(f"📊 Total offers: {stats_final['total']}")
-    print(f"✅ Active offers: {stats_final['active']}")
-    print(f"🆕 New offers (no details): {stats_final['new']}")
-    print(f"📝 Updated offers (with details): {stats_final['updated']}")
-    print("─" * 70)
+    print_database_status("FINAL DATABASE STATUS", stats_final)
     
     print(f"\\n🕐 Completed at: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
     print("\\n✅ Workflow complete!\\n")
@@ -196,6 +198,9 @@ Examples:
   
   # Update stale offers (older than 48 hours)
   python run_parsers.py --url "https://..." --pages 3 --update-limit 30 --max-age-hours 48
+  
+  # Rescore only offers updated in this run
+  python run_parsers.py --all-sources --pages 3 --update-limit 25 --incremental-scores
         '''
     )
     
@@ -255,6 +260,12 @@ Examples:
         help='Run without prompts (requires --update-limit or uses defaults)'
     )
     
+    parser.add_argument(
+        '--incremental-scores',
+        action='store_true',
+        help='Only rescore offers updated since their last scoring'
+    )
+    
     parser.add_argument(
         '--loop',
         action='store_true',
@@ -268,6 +279,14 @@ Examples:
         help='Interval between loop cycles in minutes (default: 60)'
     )
     
+    parser.add_argument(
+        '--full-rescore-every',
+        type=int,
+        default=24,
+        help='In loop mode, rebuild all scores every N cycles and only rescore '
+             'updated offers in between (default: 24)'
+    )
+    
     args = parser.parse_args()
     
     if args.loop:
@@ -275,9 +294,12 @@ Examples:
         print(f"🔄 Cycle interval: {args.interval} minutes")
         print(f"🚀 Initial run starting now...")
         
+        cycle = 0
         while True:
             try:
-                run_workflow(args)
+                full_rescore = cycle % max(args.full_rescore_every, 1) == 0
+                cycle += 1
+                run_workflow(args, full_rescore=full_rescore)
                 print(f"\\n😴 Sleeping for {args.interval} minutes... (Next run at: "
                       f"{(datetime.now().replace(second=0, microsecond=0) + __import__('datetime').timedelta(minutes=args.interval)).strftime('%H:%M')})")
                 time.sleep(args.interval * 60)
@@ -15,19 +15,27 @@ project_root = os.path.dirname(os.path.dirname(current_dir))
 if project_root not in sys.path:
     sys.path.insert(0, project_root)
 
-from src.core.database import engine, SessionLocal
+from src.core.database import SessionLocal
 from datetime import datetime
 import asyncio
 from src.core.notifications import send_high_score_notifications
 
 
-def calculate_scores():
-    """Calculate scores for all offers and populate offer_scores table."""
+def calculate_scores(incremental=False):
+    """Calculate scores for all offers and populate offer_scores table.
+
+    With incremental=True only offers updated since their last scoring
+    (or never scored) are recalculated; market medians are still taken
+    from the whole active market.
+    """
     
     session = SessionLocal()
     
     try:
-        print("🔄 Calculating scores for all apartments...")
+        if incremental:
+            print("🔄 Calculating scores for updated apartments...")
+        else:
+            print("🔄 Calculating scores for all apartments...")
         
         # Execute the scoring calculation query
         query = text("""
@@ -64,6 +72,13 @@ def calculate_scores():
             JOIN offer_prices op ON o.id = op.offer_id
             LEFT JOIN offer_stats os ON o.id = os.offer_id
             WHERE o.is_active = TRUE
+              AND (
+                NOT :incremental
+                OR NOT EXISTS (
+                    SELECT 1 FROM offer_scores s
+                    WHERE s.offer_id = o.id AND s.calculated_at >= o.updated_at
+                )
+              )
             ORDER BY o.id, op.scraped_at DESC
         ),
         scored_offers AS (
@@ -169,12 +184,11 @@ def calculate_scores():
             calculated_at = NOW()
         """)
         
-        result = session.execute(query)
+        result = session.execute(query, {'incremental': incremental})
         session.commit()
         
-        # Get count of scored offers
-        count_query = text("SELECT COUNT(*) FROM offer_scores")
-        count = session.execute(count_query).scalar()
+        # Rows inserted or updated by the upsert
+        count = result.rowcount
         
         print(f"✅ Successfully calculated scores for {count} apartments")
         print(f"⏰ Calculation completed at: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")